@@ -1,28 +1,51 @@
 #!/usr/bin/env python3
 import os
+import asyncio
 import json
+import math
+import threading
+import time
 from datetime import datetime, timedelta
-from dateutil import parser as dparser
+from functools import lru_cache, wraps
+from types import MappingProxyType
 from typing import Optional
 
-import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.retry import Retry
 import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from google.oauth2.service_account import Credentials
 from telegram import (
     Update, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
 )
 from telegram.ext import (
-    Application, CommandHandler, MessageHandler, filters,
+    Application, BaseUpdateProcessor, CommandHandler, MessageHandler, filters,
     ConversationHandler, CallbackQueryHandler, ContextTypes
 )
+from telegram.request import HTTPXRequest
 
 
 # ---------- Google Sheets ----------
+DEFAULT_CATS = ("Food", "Transport", "Entertainment", "Other")
+# Spreadsheet is opened once by get_spreadsheet(),
+# worksheet handles once per name by open_sheet()
+_spreadsheet = None
+_worksheets = {}
+SHEETS_TIMEOUT = 30  # seconds, for every Sheets API request
+# read_sheet() retries transient errors (see is_transient_error) with exponential backoff
+READ_ATTEMPTS = 3
+READ_RETRY_DELAY = 0.3  # seconds, doubled after each failed attempt
+# Last categories read from Config sheet, reused by load_categories() for
+# CATS_CACHE_TTL seconds unless a reload is forced
+CATS_CACHE_TTL = 60  # seconds
+_cats_cache = {"cats": None, "ts": 0.0}
+
+
 def test_google_sheets_connection():
     """Tests connection to Google Sheets."""
     try:
-        open_sheet("Config")
+        read_sheet("Config", lambda ws: ws)
         print("✅ Google Sheets connection successful")
         return True
     except Exception as e:
@@ -30,7 +53,12 @@ def test_google_sheets_connection():
         return False
 
 
-def open_sheet(sheet_name="Data"):
+def get_spreadsheet():
+    """Returns the Spreadsheet handle, authorizing and opening it once per process."""
+    global _spreadsheet
+    if _spreadsheet is not None:
+        return _spreadsheet
+    
     scope = ["https://www.googleapis.com/auth/drive",
              "https://www.googleapis.com/auth/spreadsheets"]
 
@@ -39,45 +67,102 @@ def open_sheet(sheet_name="Data"):
     if not creds_path:
         raise RuntimeError("Environment variable GOOGLE_CREDS_PATH not found.")
 
-    # Authorize using file at specified path
-    creds = ServiceAccountCredentials.from_json_keyfile_name(creds_path, scope)
+    # Authorize using file at specified path; google-auth caches the access
+    # token and refreshes it lazily when it expires
+    creds = Credentials.from_service_account_file(creds_path, scopes=scope)
 
     gc = gspread.authorize(creds)
+    # gspread waits forever by default; a stalled request would hang its
+    # handler (or the append flusher) for good
+    gc.http_client.set_timeout(SHEETS_TIMEOUT)
+    # Keep-alive pool shared by all Sheets calls (worker threads included),
+    # so each request reuses an open TLS connection. Retries are left to
+    # read_sheet() and flush_pending_rows(), no adapter-level retries
+    gc.http_client.session.mount(
+        "https://", HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    )
+    # Opening by key skips the Drive search that opening by title needs
+    sheet_id_env = os.getenv("SHEET_ID")
     sheet_name_env = os.getenv("SHEET_NAME")
-    if not sheet_name_env:
-        raise RuntimeError("Environment variable SHEET_NAME not found.")
-
-    sh = gc.open(sheet_name_env)
-    return sh.worksheet(sheet_name)
+    if sheet_id_env:
+        _spreadsheet = gc.open_by_key(sheet_id_env)
+    elif sheet_name_env:
+        _spreadsheet = gc.open(sheet_name_env)
+    else:
+        raise RuntimeError("Environment variable SHEET_ID or SHEET_NAME not found.")
+    return _spreadsheet
 
 
-def validate_categories(categories: list[str]) -> list[str]:
-    """Validates and cleans category list."""
-    if not categories:
-        return []
-    
-    # Remove duplicates, preserving order
-    seen = set()
-    unique_categories = []
-    for cat in categories:
-        cat_clean = cat.strip()
-        if cat_clean and cat_clean not in seen:
-            seen.add(cat_clean)
-            unique_categories.append(cat_clean)
-    
-    return unique_categories
+def open_sheet(sheet_name="Data"):
+    """Returns worksheet handle; the metadata lookup is done only on first call."""
+    ws = _worksheets.get(sheet_name)
+    if ws is None:
+        ws = _worksheets[sheet_name] = get_spreadsheet().worksheet(sheet_name)
+    return ws
 
 
-def load_categories() -> list[str]:
-    """Reads category list from column A of Config sheet."""
+def is_transient_error(e: BaseException) -> bool:
+    """True for errors worth retrying: network failures, 429 and 5xx responses."""
+    if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(e, gspread.exceptions.APIError):
+        status = getattr(e.response, "status_code", 0)
+        return status == 429 or status >= 500
+    return False
+
+
+def append_not_sent(e: BaseException) -> bool:
+    """True only if a failed append surely never reached Sheets: a 429
+    response or no connection at all. Other errors (5xx, read timeouts,
+    dropped connections) may come after the rows were already written."""
+    if isinstance(e, gspread.exceptions.APIError):
+        return getattr(e.response, "status_code", 0) == 429
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(e, requests.exceptions.ConnectionError) and e.args:
+        return isinstance(getattr(e.args[0], "reason", None), NewConnectionError)
+    return False
+
+
+def read_sheet(sheet_name, read):
+    """Calls read(worksheet). On transient error drops the cached handle,
+    looks the worksheet up again and retries with backoff, READ_ATTEMPTS
+    times in total. Only for reads, writes are not retried.
+    Called without _sheet_lock held, so the backoff never stalls other threads."""
+    for attempt in range(READ_ATTEMPTS):
+        try:
+            return read(open_sheet(sheet_name))
+        except Exception as e:
+            if attempt == READ_ATTEMPTS - 1 or not is_transient_error(e):
+                raise
+            print(f"⚠️  Sheets read error on {sheet_name}, retrying: {e}")
+            _worksheets.pop(sheet_name, None)
+            time.sleep(READ_RETRY_DELAY * 2 ** attempt)
+
+
+@lru_cache(maxsize=8)
+def validate_categories(categories: tuple[str, ...]) -> tuple[str, ...]:
+    """Validates and cleans category list; unchanged Config is not re-checked."""
+    # Strip and remove empty values and duplicates, preserving order
+    stripped = (cat.strip() for cat in categories or ())
+    return tuple(dict.fromkeys(cat for cat in stripped if cat))
+
+
+def load_categories(default=DEFAULT_CATS, force: bool = False) -> Optional[list[str]]:
+    """Reads category list from column A of Config sheet, or returns the list
+    read less than CATS_CACHE_TTL ago unless force is set.
+    Returns a copy of default if the sheet can't be read."""
+    cached = _cats_cache["cats"]
+    if cached and not force and time.monotonic() - _cats_cache["ts"] < CATS_CACHE_TTL:
+        return list(cached)
     try:
-        cfg_ws = open_sheet("Config")  # ← sheet name where list is stored
-        col = cfg_ws.col_values(1)  # A:A
+        # "Config" is the sheet name where list is stored, A:A
+        col = read_sheet("Config", lambda ws: ws.col_values(1))
         col = [c.strip() for c in col if c.strip()]  # remove empty
         categories = col[1:] if len(col) > 1 else []  # skip header
         
         # Validate categories
-        categories = validate_categories(categories)
+        categories = list(validate_categories(tuple(categories)))
         
         # Check that categories are not empty
         if not categories:
@@ -85,46 +170,243 @@ def load_categories() -> list[str]:
             return []
             
         print(f"✅ Loaded {len(categories)} categories: {', '.join(categories)}")
+        _cats_cache.update(cats=tuple(categories), ts=time.monotonic())
         return categories
         
     except Exception as e:
         print(f"❌ Error loading categories: {e}")
         # Return default categories in case of error
-        return ["Food", "Transport", "Entertainment", "Other"]
+        return list(default) if default is not None else None
 
 
 # ---------- Bot constants ----------
 def initialize_categories():
-    """Initializes categories on bot startup."""
-    global CATS
-    
-    # Test Google Sheets connection
-    if not test_google_sheets_connection():
+    """Loads categories on bot startup (called from post_init)."""
+    # Loading Config is the connection test itself, no separate probe
+    cats = load_categories(None)
+    if cats is None:
         print("⚠️  Using default categories due to connection issues")
-        CATS = ["Food", "Transport", "Entertainment", "Other"]
-        return CATS
-    
-    CATS = load_categories()
-    if not CATS:
+        return DEFAULT_CATS
+    if not cats:
         print("⚠️  Using default categories")
-        CATS = ["Food", "Transport", "Entertainment", "Other"]
-    return CATS
+        return DEFAULT_CATS
+    save_cached_categories(cats)
+    return cats
 
-CATS = initialize_categories()
-CURS = ["₽", "дин", "€", "¥"]
+
+def load_cached_categories() -> Optional[list[str]]:
+    """Reads categories saved by the previous run, None if there are none."""
+    try:
+        with open(CATS_CACHE_PATH, encoding="utf-8") as f:
+            cats = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️  Could not load cached categories: {e}")
+        return None
+    cats = validate_categories(tuple(c for c in cats if isinstance(c, str)))
+    return list(cats) or None
+
+
+def save_cached_categories(cats):
+    """Saves categories loaded from Config sheet for the next startup."""
+    try:
+        tmp_path = CATS_CACHE_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(cats), f, ensure_ascii=False)
+        os.replace(tmp_path, CATS_CACHE_PATH)
+    except Exception as e:
+        print(f"⚠️  Could not save cached categories: {e}")
+
+# Defaults until post_init loads Config sheet, so importing bot needs no network
+CATS = DEFAULT_CATS
+CATS_TEXT = ", ".join(CATS)  # for /categories and /reloadcats, see set_categories
+# Config sheet is re-read this often, /reloadcats applies changes right away
+CATS_REFRESH_INTERVAL = 15 * 60  # seconds
+# Last loaded categories, so startup doesn't wait for Config sheet
+CATS_CACHE_PATH = os.getenv("CATS_CACHE_PATH", "/tmp/cats_cache.json")
+CURS = ("₽", "дин", "€", "¥")
 MONTH_FMT = "%Y-%m"
 DATE_FMT = "%d.%m.%Y"
-SPENDERS = ["Lisa", "Azat"]
+SPENDERS = ("Lisa", "Azat")
+
+
+# ---------- Keyboards ----------
+class CachedReplyKeyboard(ReplyKeyboardMarkup):
+    """ReplyKeyboardMarkup that serializes itself once instead of on every send."""
+    __slots__ = ("_cached_dict",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        with self._unfrozen():
+            self._cached_dict = super().to_dict()
+
+    def to_dict(self, recursive: bool = True):
+        return self._cached_dict
+
+
+class CachedInlineKeyboard(InlineKeyboardMarkup):
+    """InlineKeyboardMarkup that serializes itself once instead of on every send."""
+    __slots__ = ("_cached_dict",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        with self._unfrozen():
+            self._cached_dict = super().to_dict()
+
+    def to_dict(self, recursive: bool = True):
+        return self._cached_dict
+
+
+def build_choice_keyboard(options) -> ReplyKeyboardMarkup:
+    """Builds one-button-per-row keyboard with "To start" at the bottom."""
+    kb = [[o] for o in options]
+    kb.append(["🏠 To start"])
+    return CachedReplyKeyboard(kb, one_time_keyboard=True, resize_keyboard=True)
+
+
+# Texts of the "To start" button, checked by back_to_start
+BACK_TEXTS = frozenset(("🏠 To start", "To start"))
+
+# Main menu prompt, also appended to final results so they need no extra message
+NEXT_ACTION_TEXT = "👋 What would you like to do next?"
+
+# Static menus are built once and reused by handlers
+KB_MAIN = CachedReplyKeyboard(
+    [["💰 Add expense", "📊 Show statistics"], ["🏠 To start"]],
+    resize_keyboard=True
+)
+KB_STAT_CATS = CachedReplyKeyboard(
+    [["All categories", "Specific category"], ["🏠 To start"]],
+    one_time_keyboard=True, resize_keyboard=True
+)
+KB_CATS = build_choice_keyboard(CATS)  # rebuilt by set_categories
+KB_CURS = build_choice_keyboard(CURS)
+KB_HOME = CachedReplyKeyboard([["🏠 To start"]], resize_keyboard=True)
+KB_STAT_TYPE = CachedReplyKeyboard(
+    [["📜 Last 3 records", "📅 Custom period", "📆 By months"], ["🏠 To start"]],
+    one_time_keyboard=True, resize_keyboard=True
+)
+KB_YES_NO = CachedReplyKeyboard(
+    [["Yes", "No"], ["🏠 To start"]],
+    one_time_keyboard=True, resize_keyboard=True
+)
+KB_DETAILS = CachedReplyKeyboard(
+    [["Show details", "Done (thanks)"], ["🏠 To start"]],
+    one_time_keyboard=True, resize_keyboard=True
+)
+IKB_COMMENT = CachedInlineKeyboard([
+    [InlineKeyboardButton("⏭️ Skip", callback_data="skip")],
+    [InlineKeyboardButton("🏠 To start", callback_data="to_start")]
+])
+IKB_DATE = CachedInlineKeyboard([
+    [InlineKeyboardButton("📅 Today", callback_data="today"),
+     InlineKeyboardButton("📆 Yesterday", callback_data="yesterday")],
+    [InlineKeyboardButton("📆 Enter date", callback_data="custom")],
+    [InlineKeyboardButton("🏠 To start", callback_data="to_start")]
+])
+
+
+def set_categories(cats):
+    """Replaces category list (kept as immutable tuple), its text and keyboard."""
+    global CATS, CATS_TEXT, KB_CATS
+    CATS = tuple(cats)
+    CATS_TEXT = ", ".join(CATS)
+    KB_CATS = build_choice_keyboard(cats)
+
+# Data sheet handle comes from open_sheet(), opened on first use
+# Guards the Data sheet caches below; held only to check or swap them,
+# never during a Sheets request
+_sheet_lock = threading.RLock()
+# One stats cache refresh at a time, so concurrent chats share a single read
+_refresh_lock = threading.Lock()
+# Bumped by every write; a read that started before a write doesn't mark
+# its result fresh, as it may not include the written rows
+_write_version = 0
+# Serializes writes of the on-disk stats copy
+_save_lock = threading.Lock()
+
+# pandas module, imported by load_pandas() on first use
+_pd = None
+
+# Parsed Data sheet cache for statistics
+STATS_CACHE_TTL = 60  # seconds
+# After TTL only rows below next_row are read; the whole sheet is re-read at
+# least once per STATS_FULL_REFRESH to pick up edits and deleted rows
+STATS_FULL_REFRESH = 10 * 60  # seconds
+_stats_cache = {
+    "df": None, "ts": 0.0, "from_disk": False,
+    "headers": [],   # header cells of STATS_RANGE columns
+    "next_row": 0,   # first sheet row not in df yet, 0 if unknown
+    "full_ts": 0.0,  # time of last full read
+}
+# Raw Data sheet values for "Last N records", see cached_values()
+_values_cache = {"values": None, "ts": 0.0}
+# compute_stats results by arguments: {key: (ts, result)}, cleared on data change
+_stats_results = {}
+# Running TOTALS[month][category][currency], rebuilt with the stats cache
+# and updated with every row merged into it, so they are exactly as fresh
+# as the stats cache (STATS_CACHE_TTL)
+_month_totals = {"data": {}, "ts": 0.0}
+_totals_lock = threading.Lock()
+# Parquet copy of the stats cache for warm restarts
+STATS_CACHE_PATH = os.getenv("STATS_CACHE_PATH", "/tmp/stats_cache.parquet")
+
+# Expense rows waiting to be written by append_flusher(), as (row, chat_id)
+APPEND_FLUSH_INTERVAL = 2.0  # seconds, doubled after each failed write
+# A batch is dropped (logged and reported to its chats) after this many
+# failed writes, or right away if the error isn't transient
+APPEND_MAX_ATTEMPTS = 6
+_pending_rows: list[tuple[list, Optional[int]]] = []
+_append_failures = 0  # failed writes of the current batch in a row
+_notify_bot = None  # set by start_append_flusher, reports dropped rows
+_rows_pending = asyncio.Event()
+_flush_lock = asyncio.Lock()
+_flusher_task: Optional[asyncio.Task] = None
+_categories_task: Optional[asyncio.Task] = None
+
+# Currency mapping for exchange rate API
+CURRENCY_CODES = {
+    "₽": "RUB",
+    "дин": "RSD",
+    "€": "EUR",
+    "¥": "JPY",
+    "$": "USD"
+}
+# Rates are fetched once per base currency per this period
+FX_RATES_TTL = 60 * 60  # seconds
+# Keep-alive session for the rates API, so repeated fetches skip TLS handshake
+_fx_session = requests.Session()
+_fx_session.mount("https://", HTTPAdapter(
+    pool_connections=4, pool_maxsize=8,
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=(502, 503, 504)),
+))
+# Last successfully fetched rates per base currency, used while the API is down
+_last_rates: dict[str, dict] = {}
+
+# "Last N records" looks at this many newest rows before reading the whole sheet
+LAST_RECORDS_WINDOW = 50
+# Data sheet header variants and fallback positions for "Last N records"
+RECORD_HEADERS = {
+    "date": (("Date", "Дата"), 0),
+    "category": (("Category", "Категория"), 2),
+    "amount": (("Amount", "Сумма"), 3),
+    "currency": (("Currency", "Валюта"), 4),
+    "spender": (("Кто внес", "Who", "Spender", "Кто", "Who внес"), 5),
+    "comment": (("Comment", "Комментарий"), 6),
+}
+
+# Data sheet columns read for statistics: Date, Month, Category, Amount, Currency
+STATS_RANGE = "A:E"
 
-# Global variable for data sheet
-sheet = None
 
 # Dictionary to map Telegram ID to user names
 # Replace with real Telegram user IDs
-TELEGRAM_USERS = {
+# Read-only at runtime, /register only prints the line to add here
+TELEGRAM_USERS = MappingProxyType({
     # Example: 123456789: "Lisa",
     248826020: "Azat",
-}
+})
 (
     CHOOSE_ACTION, CHOOSE_CAT, TYPING_AMT, CHOOSE_CUR,
     TYPING_CMNT,
@@ -135,55 +417,326 @@ TELEGRAM_USERS = {
 
 
 # -------- Helpers ----------
+# Spaces (incl. non-breaking) and apostrophes only ever group thousands
+_AMT_TRANS = str.maketrans({" ": "", "\u00a0": "", "\u202f": "", "'": ""})
+
+
 def month_of(date_str: str) -> str:
-    return datetime.strptime(date_str, DATE_FMT).strftime(MONTH_FMT)
+    """"13.07.2025" -> "2025-07"; raises ValueError if date_str isn't in DATE_FMT."""
+    # Callers pass strftime(DATE_FMT) output, so a shape check is enough before slicing
+    if len(date_str) != 10 or date_str[2] != "." or date_str[5] != ".":
+        raise ValueError(f"not a {DATE_FMT} date: {date_str!r}")
+    return f"{date_str[6:]}-{date_str[3:5]}"
+
+
+# Typed dates: documented DD.MM.YYYY first, then common variants
+USER_DATE_FMTS = (DATE_FMT, "%d.%m.%y", "%d/%m/%Y", "%d/%m/%y", "%Y-%m-%d")
+
+
+def parse_user_date(text: str) -> datetime:
+    """Parses typed date like "13.07.2025"; raises ValueError."""
+    text = text.strip()
+    for fmt in USER_DATE_FMTS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"unknown date format: {text!r}")
+
+
+def parse_user_amount(text: str) -> float:
+    """Parses typed amount like "1 000,50" or "1,234.50"; raises ValueError,
+    also for ambiguous input like "1,500" (1.5 or 1500?).
+
+    >>> [parse_user_amount(t) for t in ("12,5", "1 000,50", "1,234.50", "1.234,50")]
+    [12.5, 1000.5, 1234.5, 1234.5]
+    >>> [parse_user_amount(t) for t in ("1,000,000", "1.000.000", "1,234,567", "0,500")]
+    [1000000.0, 1000000.0, 1234567.0, 0.5]
+    >>> parse_user_amount("1,500")
+    Traceback (most recent call last):
+    ValueError: ambiguous amount: '1,500'
+    """
+    txt = text.strip().translate(_AMT_TRANS)
+    last = max(txt.rfind(","), txt.rfind("."))
+    if last < 0:
+        return float(txt)
+    sep = txt[last]
+    other = "." if sep == "," else ","
+    if txt.count(sep) > 1:
+        # A separator typed more than once only groups thousands
+        if other in txt:
+            raise ValueError(f"ambiguous amount: {text!r}")
+        integer, frac, group = txt, "", sep
+    else:
+        # Single or last separator is decimal, the other one groups thousands
+        integer, frac = txt[:last], txt[last + 1:]
+        group = other if other in integer else None
+        if group is None and len(frac) == 3 and integer.lstrip("+-") not in ("", "0"):
+            raise ValueError(f"ambiguous amount: {text!r}")
+    if group:
+        head, *groups = integer.split(group)
+        if not (head.lstrip("+-").isdigit() and len(head.lstrip("+-")) <= 3
+                and all(len(g) == 3 and g.isdigit() for g in groups)):
+            raise ValueError(f"bad thousands grouping: {text!r}")
+        integer = integer.replace(group, "")
+    return float(f"{integer}.{frac}")
+
+
+@lru_cache(maxsize=1)
+def last_12_months(year: int, month: int) -> tuple[str, ...]:
+    """Returns the 12 months ending with given one, newest first, in MONTH_FMT."""
+    total = year * 12 + month - 1
+    return tuple(
+        f"{y:04d}-{m + 1:02d}" for y, m in (divmod(total - i, 12) for i in range(12))
+    )
+
+
+@lru_cache(maxsize=1)
+def months_keyboard(year: int, month: int) -> ReplyKeyboardMarkup:
+    """Builds month choice keyboard once per calendar month."""
+    return build_choice_keyboard(last_12_months(year, month))
+
+
+@lru_cache(maxsize=8)
+def currencies_keyboard(currencies: tuple[str, ...]) -> ReplyKeyboardMarkup:
+    """Builds conversion target keyboard once per distinct currency set."""
+    return build_choice_keyboard(currencies)
 
 
 def get_user_info(update: Update) -> tuple[str, str]:
     """Gets user information from Telegram."""
     user = update.effective_user
-    user_id = user.id
-    username = user.username or user.first_name or f"User{user_id}"
-    
-    # Check if user is in dictionary
-    if user_id in TELEGRAM_USERS:
-        return TELEGRAM_USERS[user_id], username
-    else:
-        # If user not found, return their name from Telegram
-        return username, username
+    # Registered users are the common case: one dict lookup, no fallback name
+    name = TELEGRAM_USERS.get(user.id)
+    if name is not None:
+        return name, user.username or user.first_name or name
+    
+    # If user not found, return their name from Telegram
+    username = user.username or user.first_name or f"User{user.id}"
+    return username, username
+
+
+async def sheet_append(row, chat_id: Optional[int] = None):
+    """Adds row to pending rows, append_flusher() writes them to the sheet in batches.
+    chat_id is told if the row can't be saved."""
+    _pending_rows.append((row, chat_id))
+    _rows_pending.set()
+
+
+def _write_rows(rows):
+    global _write_version
+    response = open_sheet().append_rows(rows, value_input_option="USER_ENTERED")
+    with _sheet_lock:
+        _write_version += 1
+        _values_cache["ts"] = 0.0
+        # Rows are written now; a failed cache update must not make the
+        # flusher send them again
+        try:
+            next_row = _stats_cache["next_row"]
+            if next_row and _appended_first_row(response) == next_row:
+                # Rows landed right after cached ones, so no read is needed to see them
+                append_stats_rows(rows)
+            elif next_row:
+                # Someone else added rows too, the next stats request reads
+                # them together with ours
+                _stats_cache["ts"] = 0.0
+                _stats_results.clear()
+            else:
+                # No cursor yet: the next full read sees the rows and rebuilds TOTALS
+                invalidate_stats_cache()
+        except Exception as e:
+            print(f"⚠️  Rows saved, stats cache will be re-read: {e}")
+            invalidate_stats_cache()
 
 
-def sheet_append(row):
-    sheet.append_row(row, value_input_option="USER_ENTERED")
+def _appended_first_row(response) -> Optional[int]:
+    """Returns first row number written by append_rows, None if unknown."""
+    try:
+        # e.g. "Data!A15:G16"
+        updated = response["updates"]["updatedRange"].rsplit("!", 1)[1]
+        return gspread.utils.a1_to_rowcol(updated.split(":")[0])[0]
+    except (KeyError, TypeError, IndexError, ValueError, gspread.exceptions.GSpreadException):
+        return None
+
+
+async def append_flusher():
+    """Waits APPEND_FLUSH_INTERVAL seconds after the first pending row so that
+    rows arriving meanwhile are written with the same append_rows call."""
+    while True:
+        await _rows_pending.wait()
+        await asyncio.sleep(APPEND_FLUSH_INTERVAL * 2 ** _append_failures)
+        try:
+            await flush_pending_rows()
+        except Exception as e:
+            print(f"❌ Error saving rows, will retry: {e}")
+
+
+async def flush_pending_rows():
+    """Writes all pending rows right away with a single append_rows call.
+    Stats handlers call it first, so a just-saved expense is always counted.
+    Rows are sent again only if the failed append surely did not land (see
+    append_not_sent), at most APPEND_MAX_ATTEMPTS times; otherwise they are
+    dropped and reported, so nothing is ever written twice."""
+    global _append_failures
+    async with _flush_lock:
+        _rows_pending.clear()
+        if not _pending_rows:
+            return
+        entries = _pending_rows.copy()
+        _pending_rows.clear()
+        try:
+            await asyncio.to_thread(_write_rows, [row for row, _ in entries])
+        except Exception as e:
+            _append_failures += 1
+            if append_not_sent(e) and _append_failures < APPEND_MAX_ATTEMPTS:
+                # Put rows back in front of anything added meanwhile, keeping order
+                _pending_rows[:0] = entries
+                _rows_pending.set()
+                raise
+            _append_failures = 0
+            print(f"❌ Dropping {len(entries)} rows that could not be saved: {e}")
+            for row, _ in entries:
+                print(f"   {row}")
+            # 4xx answers and connections never made surely wrote nothing,
+            # after a 5xx or a timeout the rows may be in the sheet already
+            maybe_saved = is_transient_error(e) and not append_not_sent(e)
+            await notify_unsaved(entries, maybe_saved)
+            return
+        except BaseException:
+            # Cancelled on shutdown, stop_append_flusher() tries once more
+            _pending_rows[:0] = entries
+            _rows_pending.set()
+            raise
+        _append_failures = 0
+
+
+async def notify_unsaved(entries, maybe_saved: bool = False):
+    """Tells each chat which of its expenses were dropped by flush_pending_rows().
+    With maybe_saved the append may have landed, so users check before re-adding."""
+    by_chat = {}
+    for row, chat_id in entries:
+        if chat_id is not None:
+            by_chat.setdefault(chat_id, []).append(row)
+    for chat_id, rows in by_chat.items():
+        # Rows are [date, month, cat, amt, cur, who, comment]
+        lines = [f"• {r[0]} | {r[2]} | {r[3]:.2f} {r[4]}" for r in rows]
+        if maybe_saved:
+            head = ("⚠️ These may not have been saved to Google Sheets, "
+                    "check the sheet or 📜 Last 3 records before adding again:\n")
+        else:
+            head = "❌ Could not save to Google Sheets, please add again:\n"
+        text = head + "\n".join(lines)
+        try:
+            await _notify_bot.send_message(chat_id, text)
+        except Exception as e:
+            print(f"⚠️  Could not report unsaved rows to chat {chat_id}: {e}")
+
+
+async def flush_before_read():
+    """Flushes pending rows before reading the sheet; on failure stats are shown without them.
+    While a failed append is backing off the flusher alone retries it."""
+    if _append_failures:
+        return
+    try:
+        await flush_pending_rows()
+    except Exception as e:
+        print(f"⚠️ Pending rows not saved yet: {e}")
+
+
+async def start_append_flusher(app: Application):
+    global _flusher_task, _notify_bot
+    _notify_bot = app.bot
+    _flusher_task = asyncio.create_task(append_flusher())
+
+
+async def categories_refresher(refresh_now: bool = False):
+    """Re-reads Config sheet every CATS_REFRESH_INTERVAL seconds, first time
+    right away if refresh_now is set."""
+    delay = 0 if refresh_now else CATS_REFRESH_INTERVAL
+    while True:
+        await asyncio.sleep(delay)
+        delay = CATS_REFRESH_INTERVAL
+        # On errors keep the current list instead of falling back to defaults
+        cats = await asyncio.to_thread(load_categories, None)
+        if cats:
+            save_cached_categories(cats)
+            set_categories(cats)
+
+
+async def post_init(app: Application):
+    """Runs once the bot is initialized, before it starts receiving updates."""
+    global _categories_task
+    await start_append_flusher(app)
+    # Authorize once first, so a wrong SHEET_ID/SHEET_NAME or credentials fail at startup
+    await asyncio.to_thread(get_spreadsheet)
+    # Categories from the previous run are used right away and refreshed in
+    # background, otherwise Config sheet is loaded before serving
+    cached_cats = load_cached_categories()
+    # Data and Config handles, categories and the disk copy load in parallel
+    _, cats, _ = await asyncio.gather(
+        asyncio.to_thread(open_sheet),
+        asyncio.to_thread(initialize_categories) if cached_cats is None
+        else asyncio.sleep(0, cached_cats),
+        asyncio.to_thread(load_stats_cache),
+    )
+    set_categories(cats)
+    _categories_task = asyncio.create_task(categories_refresher(cached_cats is not None))
+    threading.Thread(target=warm_stats_cache, daemon=True).start()
+
+
+async def post_stop(app: Application):
+    """Stops background tasks once the bot stops receiving updates."""
+    if _categories_task:
+        _categories_task.cancel()
+    await stop_append_flusher(app)
+
+
+async def stop_append_flusher(app: Application):
+    """Stops background flusher and writes pending rows on shutdown."""
+    if _flusher_task:
+        _flusher_task.cancel()
+        try:
+            await _flusher_task
+        except asyncio.CancelledError:
+            pass
+    await flush_pending_rows()
+
+
+@lru_cache(maxsize=16)
+def _fetch_rates(base: str, period: int) -> dict:
+    """Fetches all rates for base currency; period makes the cache expire.
+    Failed requests raise, so they are not cached."""
+    # Use exchangerate-api.com (free)
+    url = f"https://api.exchangerate-api.com/v4/latest/{base}"
+    response = _fx_session.get(url, timeout=5)
+    response.raise_for_status()
+    return response.json().get("rates", {})
 
 
 def get_exchange_rate(from_currency: str, to_currency: str) -> Optional[float]:
-    """Gets exchange rate via exchangerate-api.com API."""
+    """Gets exchange rate via exchangerate-api.com API. Rates are looked up in
+    the target currency table, so converting several currencies into one
+    costs a single request per FX_RATES_TTL. Falls back to last known rates
+    if API is down."""
     try:
         if from_currency == to_currency:
             return 1.0
         
-        # Currency mapping for API
-        currency_map = {
-            "₽": "RUB",
-            "дин": "RSD", 
-            "€": "EUR",
-            "¥": "JPY",
-            "$": "USD"
-        }
-        
-        from_cur = currency_map.get(from_currency, from_currency)
-        to_cur = currency_map.get(to_currency, to_currency)
-        
-        # Use exchangerate-api.com (free)
-        url = f"https://api.exchangerate-api.com/v4/latest/{from_cur}"
-        response = requests.get(url, timeout=5)
+        from_cur = CURRENCY_CODES.get(from_currency, from_currency)
+        to_cur = CURRENCY_CODES.get(to_currency, to_currency)
         
-        if response.status_code == 200:
-            data = response.json()
-            rate = data.get("rates", {}).get(to_cur)
-            if rate:
-                return float(rate)
+        try:
+            rates = _fetch_rates(to_cur, int(time.time() // FX_RATES_TTL))
+            _last_rates[to_cur] = rates
+        except Exception as e:
+            if to_cur not in _last_rates:
+                raise
+            print(f"⚠️  Rates API unavailable, using last known {to_cur} rates: {e}")
+            rates = _last_rates[to_cur]
+        # Table holds how much of from_cur one to_cur buys
+        rate = rates.get(from_cur)
+        if rate:
+            return 1 / float(rate)
         
         return None
     except Exception as e:
@@ -191,117 +744,101 @@ def get_exchange_rate(from_currency: str, to_currency: str) -> Optional[float]:
         return None
 
 
-def get_currencies_from_sheet() -> list[str]:
+def get_currencies_from_sheet() -> tuple[str, ...]:
     """Gets list of unique currencies from Google Sheets."""
     try:
-        all_records = sheet.get_all_records()
-        if not all_records:
+        df = get_stats_df()
+        if df is None or df.empty:
             return CURS  # Return default currencies if no data
         
-        currencies = set()
-        for record in all_records:
-            currency = record.get("Currency") or record.get("Валюта")
-            if currency:
-                currencies.add(currency)
+        currencies = set(df["Currency"].unique()) - {""}
         
         # Return sorted list, or default if empty
-        return sorted(list(currencies)) if currencies else CURS
+        return tuple(sorted(currencies)) if currencies else CURS
     except Exception as e:
         print(f"Error getting currencies: {e}")
         return CURS
 
 
+def cached_values() -> list[list[str]]:
+    """Returns all Data sheet values, re-read at most once per STATS_CACHE_TTL
+    and after every write."""
+    with _sheet_lock:
+        ts = _values_cache["ts"]
+        if ts and time.monotonic() - ts < STATS_CACHE_TTL:
+            return _values_cache["values"]
+        version = _write_version
+    values = read_sheet("Data", lambda ws: ws.get_all_values())
+    with _sheet_lock:
+        # Kept only if no write landed during the read
+        if version == _write_version:
+            _values_cache["values"] = values
+            _values_cache["ts"] = time.monotonic()
+    return values
+
+
+def tail_values(window: int):
+    """Reads header row and the rows from `window` rows above the stats cursor
+    down to the end of Data sheet, in one batchGet request.
+    Returns (values, covers_whole_sheet), or None if the cursor is unknown."""
+    next_row = _stats_cache["next_row"]
+    if not next_row:
+        return None
+    start = max(2, next_row - window)
+    # Open-ended range, so rows added after the cursor are included too
+    header, rows = read_sheet("Data", lambda ws: ws.batch_get(["1:1", f"A{start}:G"]))
+    return [header[0] if header else []] + list(rows), start == 2
+
+
 def get_last_n_records(n: int = 3, category: str = None) -> str:
     """Returns last N records from Google Sheets, optionally filtered by category."""
     try:
-        all_records = sheet.get_all_records()
-        if not all_records:
-            return "📭 No records"
-        
-        # Filter by category if specified
-        if category and category != "All":
-            all_records = [r for r in all_records if r.get("Category") == category]
+        filter_cat = category if category and category != "All" else None
         
-        if not all_records:
-            return f"📭 No records for category: {category}"
-        
-        # Get headers to determine correct column name
-        headers = sheet.row_values(1) if sheet.row_values(1) else []
-        
-        # Determine "Spender" column name - try different variants
-        spender_key = None
-        possible_keys = ["Кто внес", "Who", "Spender", "Кто", "Who внес"]
-        for key in possible_keys:
-            if key in headers:
-                spender_key = key
-                break
+        def pick(values):
+            """Returns up to n newest matching rows and cell getter for them."""
+            # Column positions by header name, README layout if header is missing
+            headers = values[0] if values else []
+            idx = {}
+            for field, (names, default) in RECORD_HEADERS.items():
+                idx[field] = next((headers.index(h) for h in names if h in headers), default)
+            
+            def cell(row, field, default="?"):
+                i = idx[field]
+                return row[i] if i < len(row) else default
+            
+            # Walk from the bottom, newest first, and stop after n matching rows
+            rows = []
+            for row in reversed(values[1:]):
+                if filter_cat is None or cell(row, "category", None) == filter_cat:
+                    rows.append(row)
+                    if len(rows) == n:
+                        break
+            return rows, cell
         
-        # If not found by name, use index (6th column, index 5)
-        if not spender_key and len(headers) > 5:
-            all_values = sheet.get_all_values()
-            if len(all_values) > 0:
-                # Filter by category if needed
-                if category and category != "All":
-                    filtered_rows = []
-                    for i, row in enumerate(all_values[1:], 1):  # Skip header
-                        if len(row) > 2 and row[2] == category:
-                            filtered_rows.append(row)
-                    last_records = filtered_rows[-n:] if len(filtered_rows) > n else filtered_rows
-                else:
-                    last_records = all_values[-n:] if len(all_values) > n else all_values[1:]
-                last_records.reverse()
-                
-                lines = [f"📋 Last {n} records:\n"]
-                for i, row in enumerate(last_records, 1):
-                    date = row[0] if len(row) > 0 else "?"
-                    cat = row[2] if len(row) > 2 else "?"
-                    # Handle amount conversion with comma/dot support
-                    if len(row) > 3 and row[3]:
-                        try:
-                            amount = float(str(row[3]).replace(",", "."))
-                        except (ValueError, TypeError):
-                            amount = 0
-                    else:
-                        amount = 0
-                    currency = row[4] if len(row) > 4 else "?"
-                    spender = row[5] if len(row) > 5 else "?"
-                    comment = row[6] if len(row) > 6 else ""
-                    
-                    comment_text = f" ({comment})" if comment else ""
-                    lines.append(
-                        f"{i}. 📅 {date} | {cat} | {amount:,.2f} {currency} | 👤 {spender}{comment_text}"
-                    )
-                
-                return "\n".join(lines)
+        # Usually the newest rows are enough; whole sheet only for rare categories
+        tail = tail_values(LAST_RECORDS_WINDOW)
+        all_values, complete = tail if tail else (cached_values(), True)
+        last_records, cell = pick(all_values)
+        if len(last_records) < n and not complete:
+            last_records, cell = pick(cached_values())
         
-        # Get last N records
-        last_records = all_records[-n:]
-        last_records.reverse()  # Show newest first
+        if not last_records:
+            return f"📭 No records for category: {category}" if filter_cat else "📭 No records"
         
         lines = [f"📋 Last {n} records:\n"]
-        for i, record in enumerate(last_records, 1):
-            date = record.get("Date", record.get("Дата", "?"))
-            cat = record.get("Category", record.get("Категория", "?"))
+        for i, row in enumerate(last_records, 1):
             # Handle amount conversion with comma/dot support
-            amount_raw = record.get("Amount", record.get("Сумма", 0))
             try:
-                amount = float(str(amount_raw).replace(",", "."))
+                amount = float(str(cell(row, "amount", "")).replace(",", "."))
             except (ValueError, TypeError):
                 amount = 0
-            currency = record.get("Currency", record.get("Валюта", "?"))
-            
-            # Use found key or try different variants
-            if spender_key:
-                spender = record.get(spender_key, "?")
-            else:
-                spender = (record.get("Кто внес") or record.get("Who") or 
-                          record.get("Spender") or record.get("Кто") or "?")
-            
-            comment = record.get("Comment", record.get("Комментарий", ""))
+            comment = cell(row, "comment", "")
             
             comment_text = f" ({comment})" if comment else ""
             lines.append(
-                f"{i}. 📅 {date} | {cat} | {amount:,.2f} {currency} | 👤 {spender}{comment_text}"
+                f"{i}. 📅 {cell(row, 'date')} | {cell(row, 'category')} | {amount:,.2f} "
+                f"{cell(row, 'currency')} | 👤 {cell(row, 'spender') or '?'}{comment_text}"
             )
         
         return "\n".join(lines)
@@ -309,154 +846,440 @@ def get_last_n_records(n: int = 3, category: str = None) -> str:
         return f"❌ Error getting records: {e}"
 
 
-def compute_stats(cat, month=None, date_from=None, date_to=None, 
-                 group_by_currency=True, convert_to_currency=None):
-    """Computes statistics with support for custom periods and currency conversion.
-    Returns tuple: (stats_text, conversion_details_dict)"""
-    conversion_details = {}
-    
-    # Get raw values to properly handle comma decimal separators
-    # Use get_all_values() to get string values - we'll parse them correctly
-    all_values = sheet.get_all_values()
-    
-    if not all_values or len(all_values) < 2:
-        return "No data 🤷", {}
-    
-    headers = all_values[0]
-    rows = all_values[1:]
-    
-    # Find column indices
-    amount_col_idx = None
-    currency_col_idx = None
-    category_col_idx = None
-    date_col_idx = None
-    month_col_idx = None
-    
-    for i, header in enumerate(headers):
-        header_lower = str(header).strip().lower()
-        if header_lower in ["amount", "сумма"]:
-            amount_col_idx = i
-        elif header_lower in ["currency", "валюта"]:
-            currency_col_idx = i
-        elif header_lower in ["category", "категория"]:
-            category_col_idx = i
-        elif header_lower in ["date", "дата"]:
-            date_col_idx = i
-        elif header_lower in ["month", "месяц"]:
-            month_col_idx = i
-    
-    if amount_col_idx is None:
-        return "❌ Error: Amount column not found", {}
-    
-    # Parse data rows with proper comma handling
-    data_rows = []
-    for row in rows:
-        if len(row) <= amount_col_idx:
-            continue
-        
-        # Get amount value - handle both string and numeric types
-        amount_raw = row[amount_col_idx]
-        
-        # If it's already a number, use it directly
-        if isinstance(amount_raw, (int, float)):
-            amount = float(amount_raw)
-        else:
-            # It's a string - need to parse it
-            amount_str = str(amount_raw).strip()
-            if not amount_str:
-                continue
-            
-            # Critical: Handle comma as decimal separator
-            # If string contains comma and looks like decimal (e.g., "7,65", "123,45")
-            # Replace comma with dot before parsing
-            # But be careful: if it's "1,234" it might be thousand separator
-            # Simple heuristic: if comma is followed by 1-3 digits at the end, it's decimal separator
-            if ',' in amount_str:
-                # Check if comma is decimal separator (followed by 1-3 digits, possibly at end)
-                parts = amount_str.split(',')
-                if len(parts) == 2 and len(parts[1]) <= 3:
-                    # This is decimal separator: "7,65" -> "7.65"
-                    amount_str = amount_str.replace(",", ".")
-                # Otherwise assume it's thousand separator and remove it: "1,234" -> "1234"
-                else:
-                    amount_str = amount_str.replace(",", "")
-            
-            # Remove spaces and other potential separators
-            amount_str = amount_str.replace(" ", "").replace("'", "").replace(" ", "")
-            
-            try:
-                amount = float(amount_str)
-            except (ValueError, TypeError):
+def load_pandas():
+    """Imports pandas on first statistics call, add-expense flow never needs it."""
+    global _pd
+    if _pd is None:
+        import pandas
+        _pd = pandas
+    return _pd
+
+
+def parse_amounts(raw):
+    """Parses a Series of raw Amount cells into floats (NaN if unparsable)."""
+    pd = load_pandas()
+    if raw.dtype.kind in "fiu":
+        return raw.astype("float64")
+    
+    # Plain numbers ("12", "7.65") need no string cleanup, only the leftovers do
+    parsed = pd.to_numeric(raw, errors="coerce").astype("float64")
+    leftover = parsed.isna() & raw.notna() & (raw != "")
+    if not leftover.any():
+        return parsed
+    amounts = raw[leftover].astype(str).str.strip()
+    
+    # Critical: Handle comma as decimal separator
+    # Simple heuristic: a single comma followed by 1-3 chars is decimal separator
+    # ("7,65" -> "7.65"), otherwise commas are thousand separators ("1,234,567")
+    decimal_comma = amounts.str.fullmatch(r"[^,]*,[^,]{0,3}")
+    amounts = amounts.where(~decimal_comma, amounts.str.replace(",", ".", regex=False))
+    
+    # Remove thousand separators, spaces and other potential separators
+    amounts = amounts.str.replace(r"[,' ]", "", regex=True)
+    parsed[leftover] = pd.to_numeric(amounts, errors="coerce")
+    return parsed
+
+
+def _build_stats_df(columns):
+    """Parses Data sheet columns (as returned for STATS_RANGE with
+    major_dimension="COLUMNS", header first) into a DataFrame for statistics.
+    Returns None if Amount column is missing."""
+    pd = load_pandas()
+    names = ["Amount", "Currency", "Category", "Date", "Month"]
+    header_names = {
+        "amount": "Amount", "сумма": "Amount",
+        "currency": "Currency", "валюта": "Currency",
+        "category": "Category", "категория": "Category",
+        "date": "Date", "дата": "Date",
+        "month": "Month", "месяц": "Month",
+    }
+    
+    # Find columns by header, the sheet may have them in any order
+    found = {}
+    for col in columns or []:
+        if col:
+            name = header_names.get(str(col[0]).strip().lower())
+            if name:
+                found[name] = col[1:]
+    
+    if "Amount" not in found:
+        return None if columns and any(columns) else pd.DataFrame(columns=names)
+    
+    # API trims trailing empty cells, so columns may be shorter than Amount
+    n = len(found["Amount"])
+    if not n:
+        return pd.DataFrame(columns=names)
+    
+    def text_col(name):
+        values = found.get(name, [])[:n]
+        return pd.Series(values + [""] * (n - len(values)), dtype=object).astype(str).str.strip()
+    
+    dates = text_col("Date")
+    if "Month" in found:
+        months = text_col("Month")
+    else:
+        # No Month column: derive it from Date, parsing each distinct date once
+        months = pd.to_datetime(dates, format=DATE_FMT, errors="coerce", cache=True)
+        months = months.dt.strftime(MONTH_FMT).fillna("")
+    
+    df = pd.DataFrame({
+        "Amount": parse_amounts(pd.Series(found["Amount"], dtype=object)),
+        "Currency": text_col("Currency"),
+        "Category": text_col("Category"),
+        "Date": dates,
+        "Month": months,
+    }, columns=names)
+    
+    # Skip rows with empty or unparsable amount
+    df = df[df["Amount"].notna()].reset_index(drop=True)
+    
+    # Few distinct values per column: categorical codes make filters and groupby cheaper
+    # and keep the cached frame small. Amount stays float64, float32 sums lose kopecks.
+    for col in ("Month", "Category", "Currency", "Date"):
+        df[col] = df[col].astype("category")
+    return df
+
+
+def stats_cache_is_fresh() -> bool:
+    """Checks whether get_stats_df() would be served without a network call."""
+    ts = _stats_cache["ts"]
+    return bool(ts) and time.monotonic() - ts < STATS_CACHE_TTL
+
+
+def refresh_stats_df():
+    """Re-reads Data sheet into the stats cache and saves a copy to disk."""
+    with _sheet_lock:
+        version = _write_version
+    # Only the columns stats need, column-major so each one parses as a whole
+    columns = read_sheet("Data", lambda ws: ws.get(STATS_RANGE, major_dimension="COLUMNS"))
+    df = _build_stats_df(columns)
+    with _sheet_lock:
+        now = time.monotonic()
+        _stats_cache["df"] = df
+        # After a write during the read the next call reads below the cursor
+        _stats_cache["ts"] = now if version == _write_version else 0.0
+        _stats_cache["full_ts"] = now
+        _stats_cache["from_disk"] = False
+        _stats_cache["headers"] = [col[0] if col else "" for col in columns]
+        # Header row included, so the longest column ends at the last used row
+        _stats_cache["next_row"] = max(map(len, columns), default=1) + 1 if df is not None else 0
+        _stats_results.clear()
+        rebuild_month_totals(df)
+    if df is not None:
+        persist_stats_cache()
+    return df
+
+
+def _merge_stats_rows(columns):
+    """Parses new rows (columns without header) and appends them to the cached frame.
+    Returns number of merged rows."""
+    pd = load_pandas()
+    headers = _stats_cache["headers"]
+    new_df = _build_stats_df([
+        [h] + (list(columns[i]) if i < len(columns) else [])
+        for i, h in enumerate(headers)
+    ])
+    if new_df is None or new_df.empty:
+        return 0
+    
+    df = pd.concat([_stats_cache["df"], new_df], ignore_index=True)
+    # concat falls back to object when categories differ
+    for col in ("Month", "Category", "Currency", "Date"):
+        df[col] = df[col].astype("category")
+    _stats_cache["df"] = df
+    _stats_results.clear()
+    add_to_month_totals(zip(new_df["Month"], new_df["Category"], new_df["Currency"], new_df["Amount"]))
+    return len(new_df)
+
+
+def read_new_rows():
+    """Reads only rows added below next_row since the last read."""
+    first, last = STATS_RANGE.split(":")
+    with _sheet_lock:
+        next_row = _stats_cache["next_row"]
+        version = _write_version
+    if not next_row:
+        # Cache was dropped after a failed write
+        return refresh_stats_df()
+    columns = read_sheet("Data", lambda ws: ws.get(f"{first}{next_row}:{last}", major_dimension="COLUMNS"))
+    with _sheet_lock:
+        # A write moved the cursor meanwhile: its rows are cached already
+        # and these may overlap them, the next call reads from the new cursor
+        if _stats_cache["next_row"] != next_row:
+            return _stats_cache["df"]
+        if columns:
+            _merge_stats_rows(columns)
+            _stats_cache["next_row"] = next_row + max(map(len, columns))
+            persist_stats_cache()
+        if version == _write_version:
+            _stats_cache["ts"] = time.monotonic()
+        return _stats_cache["df"]
+
+
+def append_stats_rows(rows):
+    """Adds rows just written by this process to the cache without reading them back."""
+    with _sheet_lock:
+        n = len(_stats_cache["headers"])
+        _merge_stats_rows([[str(r[i]) for r in rows] for i in range(n)])
+        _stats_cache["next_row"] += len(rows)
+    persist_stats_cache()
+
+
+def get_stats_df():
+    """Returns parsed Data sheet, re-fetching it at most once per STATS_CACHE_TTL."""
+    if stats_cache_is_fresh():
+        return _stats_cache["df"]
+    
+    with _sheet_lock:
+        from_disk = _stats_cache["from_disk"]
+        _stats_cache["from_disk"] = False
+    if from_disk:
+        # Warm restart: serve saved copy while rows added since it was saved
+        # (or the whole sheet, if the copy has no row cursor) are read in background
+        threading.Thread(target=update_stats_df, daemon=True).start()
+        return _stats_cache["df"]
+    return update_stats_df()
+
+
+def update_stats_df():
+    """Reads rows below the cursor, or the whole sheet once per STATS_FULL_REFRESH."""
+    with _refresh_lock:
+        # Another chat may have refreshed the cache while we waited
+        if stats_cache_is_fresh():
+            return _stats_cache["df"]
+        if (_stats_cache["next_row"] and _stats_cache["df"] is not None
+                and time.monotonic() - _stats_cache["full_ts"] < STATS_FULL_REFRESH):
+            return read_new_rows()
+        return refresh_stats_df()
+
+
+def persist_stats_cache():
+    """Saves current stats cache to disk in a background thread."""
+    threading.Thread(target=save_stats_cache, daemon=True).start()
+
+
+def save_stats_cache():
+    """Saves stats frame with its row cursor to STATS_CACHE_PATH, so the next
+    process start only has to read rows added after it."""
+    with _save_lock:
+        with _sheet_lock:
+            if _stats_cache["df"] is None:
+                return
+            # Shallow copy: attrs go to Parquet metadata, cached frame stays as is
+            df = _stats_cache["df"].copy(deep=False)
+            df.attrs = {
+                "next_row": _stats_cache["next_row"],
+                "headers": list(_stats_cache["headers"]),
+            }
+        tmp_path = STATS_CACHE_PATH + ".tmp"
+        try:
+            df.to_parquet(tmp_path, engine="pyarrow", compression="zstd")
+            os.replace(tmp_path, STATS_CACHE_PATH)
+        except Exception as e:
+            print(f"⚠️  Could not save stats cache: {e}")
+
+
+def load_stats_cache():
+    """Loads stats frame saved by previous process, if any."""
+    if not os.path.exists(STATS_CACHE_PATH):
+        return
+    pd = load_pandas()
+    try:
+        df = pd.read_parquet(STATS_CACHE_PATH, engine="pyarrow")
+    except Exception as e:
+        print(f"⚠️  Could not load stats cache: {e}")
+        return
+    with _sheet_lock:
+        if _stats_cache["df"] is not None:
+            return
+        _stats_cache["df"] = df
+        _stats_cache["from_disk"] = True
+        # Copies saved by older versions have no cursor and get a full re-read
+        _stats_cache["next_row"] = int(df.attrs.get("next_row", 0))
+        _stats_cache["headers"] = list(df.attrs.get("headers", []))
+        _stats_cache["full_ts"] = time.monotonic()
+        rebuild_month_totals(df)
+    print(f"✅ Loaded {len(df)} cached rows from {STATS_CACHE_PATH}")
+
+
+def warm_stats_cache():
+    """Reads Data sheet (or rows added since the disk copy) at startup, so
+    the first statistics request doesn't wait for it."""
+    try:
+        get_stats_df()
+    except Exception as e:
+        print(f"⚠️  Could not prefetch statistics data: {e}")
+
+
+def rebuild_month_totals(df):
+    """Recomputes TOTALS[month][category][currency] from the stats frame."""
+    totals = {}
+    if df is not None and not df.empty:
+        sums = df.groupby(["Month", "Category", "Currency"], observed=True)["Amount"].sum()
+        for (month, cat, cur), amt in sums.items():
+            totals.setdefault(month, {}).setdefault(cat, {})[cur] = float(amt)
+    with _totals_lock:
+        _month_totals["data"] = totals
+        _month_totals["ts"] = time.monotonic()
+
+
+def add_to_month_totals(entries):
+    """Adds (month, category, currency, amount) entries of freshly written rows.
+    Unparsable (NaN) amounts are skipped, as groupby sums do."""
+    with _totals_lock:
+        data = _month_totals["data"]
+        for month, cat, cur, amt in entries:
+            amt = float(amt)
+            if math.isnan(amt):
                 continue
-        
-        currency = row[currency_col_idx].strip() if currency_col_idx and len(row) > currency_col_idx else ""
-        category = row[category_col_idx].strip() if category_col_idx and len(row) > category_col_idx else ""
-        date = row[date_col_idx].strip() if date_col_idx and len(row) > date_col_idx else ""
-        month_val = row[month_col_idx].strip() if month_col_idx and len(row) > month_col_idx else ""
-        
-        data_rows.append({
-            "Amount": amount,
-            "Currency": currency,
-            "Category": category,
-            "Date": date,
-            "Month": month_val
-        })
-    
-    if not data_rows:
-        return "No data 🤷", {}
-    
-    df = pd.DataFrame(data_rows)
+            by_cur = data.setdefault(month, {}).setdefault(cat, {})
+            by_cur[cur] = by_cur.get(cur, 0.0) + amt
+
+
+def month_totals_df(month: str, cat: str):
+    """Per-currency totals for a month from TOTALS, without touching the sheet.
+    Returns None when TOTALS were not built yet. Callers check that the stats
+    cache is fresh first, TOTALS only know the rows it has seen."""
+    sums = {}
+    with _totals_lock:
+        if not _month_totals["ts"]:
+            return None
+        for c, by_cur in _month_totals["data"].get(month, {}).items():
+            if cat == "All" or c == cat:
+                for cur, amt in by_cur.items():
+                    sums[cur] = sums.get(cur, 0.0) + amt
+    
+    pd = load_pandas()
+    return pd.DataFrame({"Currency": list(sums), "Amount": list(sums.values())})
+
+
+def invalidate_stats_cache():
+    """Forces the next get_stats_df() call to re-read the sheet."""
+    _stats_cache["df"] = None
+    _stats_cache["ts"] = 0.0
+    _stats_cache["from_disk"] = False
+    _stats_cache["next_row"] = 0
+    _stats_results.clear()
+
+
+def _filter_stats_df(df, cat, month=None, date_from=None, date_to=None):
+    """Filters stats DataFrame by period and category with one combined mask.
+    Returns tuple: (filtered Currency/Amount frame, error_text)"""
+    pd = load_pandas()
+    mask = None
     
     # Filter by period
     if month:
         if "Month" not in df.columns:
-            return "❌ Error: Month column not found", {}
-        df = df[df["Month"] == month]
+            return None, "❌ Error: Month column not found"
+        mask = df["Month"].values == month
     elif date_from and date_to:
         # Convert dates to datetime for comparison
         if "Date" not in df.columns:
-            return "❌ Error: Date column not found", {}
-        df["Date"] = pd.to_datetime(df["Date"], format=DATE_FMT, errors='coerce')
+            return None, "❌ Error: Date column not found"
+        # Date is categorical: parse only the distinct dates, then compare
+        # per category and spread the result to rows through the codes
+        dates = df["Date"].astype("category").values
+        parsed = pd.to_datetime(dates.categories, format=DATE_FMT, errors='coerce')
         date_from_dt = pd.to_datetime(date_from, format=DATE_FMT)
         date_to_dt = pd.to_datetime(date_to, format=DATE_FMT)
-        df = df[(df["Date"] >= date_from_dt) & (df["Date"] <= date_to_dt)]
-        df["Date"] = df["Date"].dt.strftime(DATE_FMT)
+        in_range = (parsed >= date_from_dt) & (parsed <= date_to_dt)
+        # Code -1 marks an empty date, such rows never match
+        mask = dates.codes >= 0
+        if len(in_range):
+            mask &= in_range[dates.codes]
     
     if cat != "All":
         if "Category" not in df.columns:
-            return "❌ Error: Category column not found", {}
-        df = df[df["Category"] == cat]
+            return None, "❌ Error: Category column not found"
+        cat_mask = df["Category"].values == cat
+        if mask is None:
+            mask = cat_mask
+        else:
+            mask &= cat_mask
+    
+    # Only these columns are used further, so copy nothing else
+    if mask is None:
+        return df[["Currency", "Amount"]], None
+    return df.loc[mask, ["Currency", "Amount"]], None
+
+
+def compute_stats(cat, month=None, date_from=None, date_to=None, 
+                 group_by_currency=True, convert_to_currency=None):
+    """Computes statistics with support for custom periods and currency conversion.
+    Returns tuple: (stats_text, conversion_details_dict)"""
+    # Results without conversion depend only on sheet data, so they are reused
+    # until the data changes or STATS_CACHE_TTL passes
+    key = None if convert_to_currency else (cat, month, date_from, date_to, group_by_currency)
+    if key:
+        hit = _stats_results.get(key)
+        if hit and time.monotonic() - hit[0] < STATS_CACHE_TTL:
+            return hit[1]
+    
+    result = _compute_stats_uncached(
+        cat, month, date_from, date_to, group_by_currency, convert_to_currency
+    )
+    if key:
+        _stats_results[key] = (time.monotonic(), result)
+    return result
+
+
+def _compute_stats_uncached(cat, month, date_from, date_to,
+                            group_by_currency, convert_to_currency):
+    conversion_details = {}
+    
+    df = None
+    if month:
+        # Brings the cache up to date first (usually a delta read, startup
+        # prefetches the rest), running totals follow it
+        if get_stats_df() is not None and stats_cache_is_fresh():
+            df = month_totals_df(month, cat)
+    
+    if df is None:
+        # Sheet is read through the TTL cache, so repeated queries skip the network
+        df = get_stats_df()
+        
+        if df is None:
+            return "❌ Error: Amount column not found", {}
+        if df.empty:
+            return "No data 🤷", {}
+        
+        df, error = _filter_stats_df(df, cat, month, date_from, date_to)
+        if error:
+            return error, {}
     
     if df.empty:
         return "No data 🤷", {}
     
     # Currency conversion if specified
     if convert_to_currency:
-        df_converted = df.copy()
-        original_currencies = df["Currency"].unique()
+        # One rate per distinct currency, then a single multiply over all rows
+        rates = {}
+        for currency in df["Currency"].unique():
+            rate = get_exchange_rate(currency, convert_to_currency)
+            if not rate:
+                return f"❌ Failed to get exchange rate for {currency} → {convert_to_currency}", {}
+            rates[currency] = rate
         
-        for currency in original_currencies:
+        # Store conversion details
+        sums = df.groupby("Currency", observed=True)["Amount"].sum()
+        for currency, original_amount in sums.items():
             if currency != convert_to_currency:
-                rate = get_exchange_rate(currency, convert_to_currency)
-                if rate:
-                    mask = df_converted["Currency"] == currency
-                    original_amount = df_converted.loc[mask, "Amount"].sum()
-                    df_converted.loc[mask, "Amount"] = df_converted.loc[mask, "Amount"] * rate
-                    df_converted.loc[mask, "Currency"] = convert_to_currency
-                    
-                    # Store conversion details
-                    conversion_details[currency] = {
-                        "rate": rate,
-                        "original_amount": original_amount,
-                        "converted_amount": original_amount * rate
-                    }
-                else:
-                    return f"❌ Failed to get exchange rate for {currency} → {convert_to_currency}", {}
-        df = df_converted
+                conversion_details[currency] = {
+                    "rate": rates[currency],
+                    "original_amount": original_amount,
+                    "converted_amount": original_amount * rates[currency]
+                }
+        
+        pd = load_pandas()
+        df = pd.DataFrame({
+            "Currency": convert_to_currency,
+            "Amount": df["Amount"] * df["Currency"].map(rates).astype(float),
+        })
     
     if group_by_currency:
         # Statistics grouped by currency
-        total = df.groupby("Currency")["Amount"].sum()
+        total = df.groupby("Currency", observed=True)["Amount"].sum()
         lines = [f"{cur}: {amt:,.2f}" for cur, amt in total.items()]
         return "\n".join(lines) if lines else "No data 🤷", conversion_details
     else:
@@ -468,9 +1291,6 @@ def compute_stats(cat, month=None, date_from=None, date_to=None,
 
 # ---------- Conversation steps ----------
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    kb = [["💰 Add expense", "📊 Show statistics"]]
-    kb.append(["🏠 To start"])
-
     # message may be None if CallbackQuery came
     if update.message:
         target = update.message
@@ -479,35 +1299,39 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     await target.reply_text(
         "👋 Hi! What would you like to do?",
-        reply_markup=ReplyKeyboardMarkup(kb, resize_keyboard=True),
+        reply_markup=KB_MAIN,
     )
     return CHOOSE_ACTION
 
 
+def back_to_start(handler):
+    """Makes handler return to main menu when "To start" is typed or pressed
+    on a reply keyboard, before any of its own logic runs."""
+    @wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if update.message and update.message.text in BACK_TEXTS:
+            context.user_data.clear()
+            await start(update, context)
+            return CHOOSE_ACTION
+        return await handler(update, context)
+    return wrapper
+
+
+@back_to_start
 async def choose_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     
-    # Handle "To start" button
-    if text == "🏠 To start" or text == "To start":
-        context.user_data.clear()
-        await start(update, context)
-        return CHOOSE_ACTION
-    
     if text == "💰 Add expense" or text == "Add expense":
-        kb = [[c] for c in CATS]
-        kb.append(["🏠 To start"])
         await update.message.reply_text(
             "📂 Choose category:", 
-            reply_markup=ReplyKeyboardMarkup(kb, one_time_keyboard=True, resize_keyboard=True)
+            reply_markup=KB_CATS
         )
         return CHOOSE_CAT
     elif text == "📊 Show statistics" or text == "Show statistics":
         # First ask: All categories or specific
-        kb = [["All categories", "Specific category"]]
-        kb.append(["🏠 To start"])
         await update.message.reply_text(
             "📊 Statistics for all categories or specific?", 
-            reply_markup=ReplyKeyboardMarkup(kb, one_time_keyboard=True, resize_keyboard=True)
+            reply_markup=KB_STAT_CATS
         )
         return STAT_CAT
     else:
@@ -516,57 +1340,39 @@ async def choose_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 # ----- Add expense flow -----
+@back_to_start
 async def choose_cat(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     
-    # Handle "To start" button
-    if text == "🏠 To start" or text == "To start":
-        context.user_data.clear()
-        await start(update, context)
-        return CHOOSE_ACTION
-    
     context.user_data["cat"] = text
-    kb = [["🏠 To start"]]
     await update.message.reply_text(
         "💵 Enter amount:",
-        reply_markup=ReplyKeyboardMarkup(kb, resize_keyboard=True)
+        reply_markup=KB_HOME
     )
     return TYPING_AMT
 
 
+@back_to_start
 async def type_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     
-    # Handle "To start" button
-    if text == "🏠 To start" or text == "To start":
-        context.user_data.clear()
-        await start(update, context)
-        return CHOOSE_ACTION
-    
     try:
-        amt = float(text.replace(",", "."))
+        amt = parse_user_amount(text)
     except ValueError:
-        await update.message.reply_text("❌ Need a number. Try again:")
+        await update.message.reply_text("❌ Need a number like 1500 or 12.50. Try again:")
         return TYPING_AMT
     context.user_data["amt"] = amt
-    kb = [[c] for c in CURS]
-    kb.append(["🏠 To start"])
     await update.message.reply_text(
         "💱 Currency?",
-        reply_markup=ReplyKeyboardMarkup(kb, one_time_keyboard=True, resize_keyboard=True)
+        reply_markup=KB_CURS
     )
     return CHOOSE_CUR
 
 
+@back_to_start
 async def choose_cur(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     
-    # Handle "To start" button
-    if text == "🏠 To start" or text == "To start":
-        context.user_data.clear()
-        await start(update, context)
-        return CHOOSE_ACTION
-    
     context.user_data["cur"] = text
     
     # Automatically detect user
@@ -574,17 +1380,14 @@ async def choose_cur(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data["spender"] = user_name
     
     # Go to comment
-    buttons = [
-        [InlineKeyboardButton("⏭️ Skip", callback_data="skip")],
-        [InlineKeyboardButton("🏠 To start", callback_data="to_start")]
-    ]
     await update.message.reply_text(
         f"👤 Auto-detected: {user_name}\n\n💬 Add comment or press «Skip»",
-        reply_markup=InlineKeyboardMarkup(buttons)
+        reply_markup=IKB_COMMENT
     )
     return TYPING_CMNT
 
 
+@back_to_start
 async def type_comment(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # This handler is called for both text messages and "skip" button press
     if update.callback_query:
@@ -595,24 +1398,13 @@ async def type_comment(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return CHOOSE_ACTION
         context.user_data["comment"] = ""
     else:
-        text = update.message.text
-        if text == "🏠 To start" or text == "To start":
-            context.user_data.clear()
-            await start(update, context)
-            return CHOOSE_ACTION
-        context.user_data["comment"] = text
+        context.user_data["comment"] = update.message.text
 
     # Choose date
-    buttons = [
-        [InlineKeyboardButton("📅 Today", callback_data="today"),
-         InlineKeyboardButton("📆 Yesterday", callback_data="yesterday")],
-        [InlineKeyboardButton("📆 Enter date", callback_data="custom")],
-        [InlineKeyboardButton("🏠 To start", callback_data="to_start")]
-    ]
     # Use update.effective_message for reply, as it can be both Message and CallbackQuery
     await update.effective_message.reply_text(
         "📅 Expense date:", 
-        reply_markup=InlineKeyboardMarkup(buttons)
+        reply_markup=IKB_DATE
     )
     return CHOOSE_DT
 
@@ -639,66 +1431,58 @@ async def choose_dt(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return TYPING_DT
 
 
+@back_to_start
 async def type_dt(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     
-    # Handle "To start" button
-    if text == "🏠 To start" or text == "To start":
-        context.user_data.clear()
-        await start(update, context)
-        return CHOOSE_ACTION
-    
     try:
-        date_str = dparser.parse(text, dayfirst=True).strftime(DATE_FMT)
-    except Exception:
+        dt = parse_user_date(text)
+    except ValueError:
         await update.message.reply_text("❌ Cannot parse date, try 13.07.2025")
         return TYPING_DT
+    
+    date_str = dt.strftime(DATE_FMT)
+    # save_row reuses it instead of parsing date_str again
+    context.user_data["month"] = dt.strftime(MONTH_FMT)
     await save_row(update, context, date_str)
     return CHOOSE_ACTION
 
 
 async def save_row(update: Update, context: ContextTypes.DEFAULT_TYPE, date_str: str):
-    month_str = month_of(date_str)
+    month_str = context.user_data.pop("month", None) or month_of(date_str)
     cat = context.user_data["cat"]
     amt = context.user_data["amt"]
     cur = context.user_data["cur"]
     who = context.user_data["spender"]
     cmnt = context.user_data.get("comment", "")
-    sheet_append([date_str, month_str, cat, amt, cur, who, cmnt])
+    await sheet_append([date_str, month_str, cat, amt, cur, who, cmnt], update.effective_chat.id)
 
     text = f"✅ Saved: {cat} – {amt:.2f} {cur} on {date_str}"
 
-    # Reply to chat depending on whether it was a message or button press
+    # Reply to chat depending on whether it was a message or button press.
+    # A typed reply carries the main menu itself, an edited inline message
+    # can't hold a reply keyboard, so the menu is sent separately
     if update.callback_query:
         await update.callback_query.edit_message_text(text)
+        await start(update, context)
     else:
-        await update.message.reply_text(text)
-
-    # Show main menu
-    await start(update, context)
+        await update.message.reply_text(f"{text}\n\n{NEXT_ACTION_TEXT}", reply_markup=KB_MAIN)
     return CHOOSE_ACTION
 
 
 # ----- Stats flow -----
+@back_to_start
 async def stat_cat(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles category selection for statistics."""
     text = update.message.text
     
-    # Handle "To start" button
-    if text == "🏠 To start" or text == "To start":
-        context.user_data.clear()
-        await start(update, context)
-        return CHOOSE_ACTION
-    
     if text == "All categories":
         context.user_data["stat_cat"] = "All"
     elif text == "Specific category":
         # Show list of categories
-        kb = [[c] for c in CATS]
-        kb.append(["🏠 To start"])
         await update.message.reply_text(
             "📂 Choose category:",
-            reply_markup=ReplyKeyboardMarkup(kb, one_time_keyboard=True, resize_keyboard=True)
+            reply_markup=KB_CATS
         )
         return STAT_CAT
     else:
@@ -707,51 +1491,44 @@ async def stat_cat(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Now ask for statistics type
     cat = context.user_data["stat_cat"]
-    kb = [["📜 Last 3 records", "📅 Custom period", "📆 By months"]]
-    kb.append(["🏠 To start"])
     await update.message.reply_text(
         f"📊 Statistics type for category '{cat}':",
-        reply_markup=ReplyKeyboardMarkup(kb, one_time_keyboard=True, resize_keyboard=True)
+        reply_markup=KB_STAT_TYPE
     )
     return STAT_TYPE
 
 
+@back_to_start
 async def stat_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles statistics type selection."""
     text = update.message.text
     
-    # Handle "To start" button
-    if text == "🏠 To start" or text == "To start":
-        context.user_data.clear()
-        await start(update, context)
-        return CHOOSE_ACTION
-    
     if text == "📜 Last 3 records":
         # Show last 3 records immediately
+        await flush_before_read()
         cat = context.user_data.get("stat_cat", "All")
-        last_records = get_last_n_records(3, cat if cat != "All" else None)
-        await update.message.reply_text(last_records)
-        await start(update, context)
+        last_records = await asyncio.to_thread(
+            get_last_n_records, 3, cat if cat != "All" else None
+        )
+        await update.message.reply_text(
+            f"{last_records}\n\n{NEXT_ACTION_TEXT}", reply_markup=KB_MAIN
+        )
         return CHOOSE_ACTION
     
     elif text == "📅 Custom period":
         # Ask for start date
-        kb = [["🏠 To start"]]
         await update.message.reply_text(
             "📅 Enter start date (DD.MM.YYYY):",
-            reply_markup=ReplyKeyboardMarkup(kb, resize_keyboard=True)
+            reply_markup=KB_HOME
         )
         return STAT_DATE_FROM
     
     elif text == "📆 By months":
         # Show list of months
         now = datetime.now()
-        months = [(now.replace(day=1) - pd.DateOffset(months=i)).strftime(MONTH_FMT) for i in range(12)]
-        kb = [[m] for m in months]
-        kb.append(["🏠 To start"])
         await update.message.reply_text(
             "📆 Choose month:",
-            reply_markup=ReplyKeyboardMarkup(kb, one_time_keyboard=True, resize_keyboard=True)
+            reply_markup=months_keyboard(now.year, now.month)
         )
         return STAT_MONTH
     
@@ -760,22 +1537,17 @@ async def stat_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return STAT_TYPE
 
 
+@back_to_start
 async def stat_date_from(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles start date input for custom period."""
     text = update.message.text
     
-    if text == "🏠 To start" or text == "To start":
-        context.user_data.clear()
-        await start(update, context)
-        return CHOOSE_ACTION
-    
     try:
-        date_from = dparser.parse(text, dayfirst=True).strftime(DATE_FMT)
+        date_from = parse_user_date(text).strftime(DATE_FMT)
         context.user_data["stat_date_from"] = date_from
-        kb = [["🏠 To start"]]
         await update.message.reply_text(
             "📅 Enter end date (DD.MM.YYYY):",
-            reply_markup=ReplyKeyboardMarkup(kb, resize_keyboard=True)
+            reply_markup=KB_HOME
         )
         return STAT_DATE_TO
     except Exception:
@@ -783,25 +1555,19 @@ async def stat_date_from(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return STAT_DATE_FROM
 
 
+@back_to_start
 async def stat_date_to(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles end date input for custom period."""
     text = update.message.text
     
-    if text == "🏠 To start" or text == "To start":
-        context.user_data.clear()
-        await start(update, context)
-        return CHOOSE_ACTION
-    
     try:
-        date_to = dparser.parse(text, dayfirst=True).strftime(DATE_FMT)
+        date_to = parse_user_date(text).strftime(DATE_FMT)
         context.user_data["stat_date_to"] = date_to
         
         # Ask about currency grouping
-        kb = [["Yes", "No"]]
-        kb.append(["🏠 To start"])
         await update.message.reply_text(
             "💱 Group by currencies?",
-            reply_markup=ReplyKeyboardMarkup(kb, one_time_keyboard=True, resize_keyboard=True)
+            reply_markup=KB_YES_NO
         )
         return STAT_GROUP_CURRENCY
     except Exception:
@@ -809,80 +1575,58 @@ async def stat_date_to(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return STAT_DATE_TO
 
 
+@back_to_start
 async def stat_month(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles month selection for statistics."""
     text = update.message.text
     
-    if text == "🏠 To start" or text == "To start":
-        context.user_data.clear()
-        await start(update, context)
-        return CHOOSE_ACTION
-    
     context.user_data["stat_month"] = text
     
     # Ask about currency grouping
-    kb = [["Yes", "No"]]
-    kb.append(["🏠 To start"])
     await update.message.reply_text(
         "💱 Group by currencies?",
-        reply_markup=ReplyKeyboardMarkup(kb, one_time_keyboard=True, resize_keyboard=True)
+        reply_markup=KB_YES_NO
     )
     return STAT_GROUP_CURRENCY
 
 
+@back_to_start
 async def stat_group_currency(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles currency grouping choice."""
     text = update.message.text
     
-    if text == "🏠 To start" or text == "To start":
-        context.user_data.clear()
-        await start(update, context)
-        return CHOOSE_ACTION
-    
     group_by_currency = text == "Yes"
     context.user_data["stat_group_currency"] = group_by_currency
     
     if group_by_currency:
         # Show statistics with grouping
-        await show_statistics_result(update, context)
-        return CHOOSE_ACTION
+        return await show_statistics_result(update, context)
     else:
         # Ask for currency to convert to
-        currencies = get_currencies_from_sheet()
-        kb = [[c] for c in currencies]
-        kb.append(["🏠 To start"])
+        currencies = await asyncio.to_thread(get_currencies_from_sheet)
         await update.message.reply_text(
             "💱 Convert all expenses to which currency?",
-            reply_markup=ReplyKeyboardMarkup(kb, one_time_keyboard=True, resize_keyboard=True)
+            reply_markup=currencies_keyboard(currencies)
         )
         return STAT_CONVERT_CURRENCY
 
 
+@back_to_start
 async def stat_convert_currency(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles currency selection for conversion."""
     text = update.message.text
     
-    if text == "🏠 To start" or text == "To start":
-        context.user_data.clear()
-        await start(update, context)
-        return CHOOSE_ACTION
-    
     context.user_data["stat_convert_to"] = text
     
     # Show statistics and ask about details
-    await show_statistics_result(update, context, ask_details=True)
-    return STAT_SHOW_DETAILS
+    return await show_statistics_result(update, context, ask_details=True)
 
 
+@back_to_start
 async def stat_show_details(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles showing conversion details or finishing."""
     text = update.message.text
     
-    if text == "🏠 To start" or text == "To start":
-        context.user_data.clear()
-        await start(update, context)
-        return CHOOSE_ACTION
-    
     if text == "Show details":
         # Show conversion details
         conversion_details = context.user_data.get("conversion_details", {})
@@ -895,16 +1639,20 @@ async def stat_show_details(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     f"  Original: {details['original_amount']:,.2f} {from_cur}\n"
                     f"  Converted: {details['converted_amount']:,.2f} {context.user_data.get('stat_convert_to', '?')}\n"
                 )
-            await update.message.reply_text("\n".join(lines))
+            text = "\n".join(lines).rstrip()
         else:
-            await update.message.reply_text("No conversion details available")
+            text = "No conversion details available"
+        await update.message.reply_text(f"{text}\n\n{NEXT_ACTION_TEXT}", reply_markup=KB_MAIN)
+        return CHOOSE_ACTION
     
     await start(update, context)
     return CHOOSE_ACTION
 
 
 async def show_statistics_result(update: Update, context: ContextTypes.DEFAULT_TYPE, ask_details: bool = False):
-    """Shows statistics result and optionally asks for details."""
+    """Shows statistics result and optionally asks for details.
+    Returns the next conversation state."""
+    await flush_before_read()
     cat = context.user_data.get("stat_cat", "All")
     group_by_currency = context.user_data.get("stat_group_currency", True)
     convert_to = context.user_data.get("stat_convert_to")
@@ -914,14 +1662,17 @@ async def show_statistics_result(update: Update, context: ContextTypes.DEFAULT_T
     date_from = context.user_data.get("stat_date_from")
     date_to = context.user_data.get("stat_date_to")
     
+    # compute_stats does blocking Sheets/FX I/O, keep it off the event loop
     if month:
-        stats, conversion_details = compute_stats(
+        stats, conversion_details = await asyncio.to_thread(
+            compute_stats,
             cat, month=month, group_by_currency=group_by_currency, 
             convert_to_currency=convert_to
         )
         period_text = f"for {month}"
     elif date_from and date_to:
-        stats, conversion_details = compute_stats(
+        stats, conversion_details = await asyncio.to_thread(
+            compute_stats,
             cat, date_from=date_from, date_to=date_to,
             group_by_currency=group_by_currency, convert_to_currency=convert_to
         )
@@ -936,29 +1687,24 @@ async def show_statistics_result(update: Update, context: ContextTypes.DEFAULT_T
         context.user_data["conversion_details"] = conversion_details
     
     # Build result text
-    if convert_to:
-        stats_text = f"📊 Statistics {period_text}, category '{cat}' (in {convert_to}):\n{stats}"
-    else:
-        stats_text = f"📊 Statistics {period_text}, category '{cat}':\n{stats}"
-    
-    await update.message.reply_text(stats_text)
+    suffix = f" (in {convert_to})" if convert_to else ""
+    stats_text = f"📊 Statistics {period_text}, category '{cat}'{suffix}:\n{stats}"
     
+    # Result and the follow-up question go out as one message
     if ask_details and conversion_details:
-        # Ask if user wants to see details
-        kb = [["Show details", "Done (thanks)"]]
-        kb.append(["🏠 To start"])
         await update.message.reply_text(
-            "Would you like to see conversion details?",
-            reply_markup=ReplyKeyboardMarkup(kb, one_time_keyboard=True, resize_keyboard=True)
+            f"{stats_text}\n\nWould you like to see conversion details?",
+            reply_markup=KB_DETAILS
         )
-    else:
-        await start(update, context)
+        return STAT_SHOW_DETAILS
+    await update.message.reply_text(f"{stats_text}\n\n{NEXT_ACTION_TEXT}", reply_markup=KB_MAIN)
+    return CHOOSE_ACTION
 
 
 async def show_categories(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Shows current categories."""
     if CATS:
-        text = f"📋 Current categories ({len(CATS)}):\n{', '.join(CATS)}"
+        text = f"📋 Current categories ({len(CATS)}):\n{CATS_TEXT}"
     else:
         text = "❌ Categories not loaded"
     
@@ -972,8 +1718,8 @@ async def whoami(update: Update, context: ContextTypes.DEFAULT_TYPE):
     username = user.username or user.first_name or f"User{user_id}"
     
     # Check if user is registered
-    if user_id in TELEGRAM_USERS:
-        registered_name = TELEGRAM_USERS[user_id]
+    registered_name = TELEGRAM_USERS.get(user_id)
+    if registered_name is not None:
         text = f"👤 Your profile:\nID: {user_id}\nName: {username}\nRegistered as: {registered_name}"
     else:
         text = f"👤 Your profile:\nID: {user_id}\nName: {username}\nStatus: Not registered\n\nUse /register to register"
@@ -992,7 +1738,7 @@ async def register_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
         name = context.args[0]
         # In real app, save to database or file
         # For now, just show information
-        text = f"✅ Registration:\nID: {user_id}\nName: {username}\nRegistered as: {name}\n\n⚠️  To save, add to code:\nTELEGRAM_USERS[{user_id}] = \"{name}\""
+        text = f"✅ Registration:\nID: {user_id}\nName: {username}\nRegistered as: {name}\n\n⚠️  To save, add to TELEGRAM_USERS in code:\n{user_id}: \"{name}\","
     else:
         text = f"📝 User registration:\n\nUse: /register NAME\n\nExample: /register Lisa\n\nYour ID: {user_id}\nYour name: {username}"
     
@@ -1003,9 +1749,9 @@ async def test_connection(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Tests connection to Google Sheets."""
     try:
         # Test connection
-        if test_google_sheets_connection():
+        if await asyncio.to_thread(test_google_sheets_connection):
             # Try to load categories
-            test_cats = load_categories()
+            test_cats = await asyncio.to_thread(load_categories)
             if test_cats:
                 text = f"✅ Connection successful!\n📋 Available categories: {len(test_cats)}\n{', '.join(test_cats)}"
             else:
@@ -1020,15 +1766,16 @@ async def test_connection(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def reload_cats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Reloads categories from Google Sheets."""
-    global CATS
-    old_cats = CATS.copy()
-    CATS = load_categories()
-    
-    if CATS:
+    old_cats = CATS
+    # On errors keep the current list, like categories_refresher does
+    cats = await asyncio.to_thread(load_categories, None, True)
+    if cats:
+        save_cached_categories(cats)
+        set_categories(cats)
         if old_cats == CATS:
-            text = f"✅ Categories already up to date ({len(CATS)}):\n{', '.join(CATS)}"
+            text = f"✅ Categories already up to date ({len(CATS)}):\n{CATS_TEXT}"
         else:
-            text = f"🔄 Categories updated ({len(CATS)}):\n{', '.join(CATS)}"
+            text = f"🔄 Categories updated ({len(CATS)}):\n{CATS_TEXT}"
     else:
         text = "❌ Failed to load categories. Check Config sheet in Google Sheets."
     
@@ -1040,14 +1787,73 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Clears temporary data and returns user to action selection.
     """
     context.user_data.clear()  # clear all accumulated data
+    # Same keyboard as in start(), sent with the notice in one message
     await update.message.reply_text(
-        "❌ Action cancelled. Starting over 🙂"
+        f"❌ Action cancelled. Starting over 🙂\n\n{NEXT_ACTION_TEXT}",
+        reply_markup=KB_MAIN
     )
-    # Show the same keyboard as in start()
-    await start(update, context)
     return CHOOSE_ACTION
 
 
+# Conversation handlers are built once at import and only registered by main()
+TEXT_INPUT = filters.TEXT & ~filters.COMMAND
+START_COMMAND = CommandHandler("start", start)  # shared by entry points and fallbacks
+ENTRY_POINTS = [START_COMMAND]
+STATE_HANDLERS = {
+    CHOOSE_ACTION: [MessageHandler(TEXT_INPUT, choose_action)],
+    CHOOSE_CAT: [MessageHandler(TEXT_INPUT, choose_cat)],
+    TYPING_AMT: [MessageHandler(TEXT_INPUT, type_amount)],
+    CHOOSE_CUR: [MessageHandler(TEXT_INPUT, choose_cur)],
+    TYPING_CMNT: [
+        MessageHandler(TEXT_INPUT, type_comment),
+        CallbackQueryHandler(type_comment, pattern="^(skip|to_start)$")
+    ],
+    CHOOSE_DT: [CallbackQueryHandler(choose_dt)],
+    TYPING_DT: [MessageHandler(TEXT_INPUT, type_dt)],
+    STAT_CAT: [MessageHandler(TEXT_INPUT, stat_cat)],
+    STAT_TYPE: [MessageHandler(TEXT_INPUT, stat_type)],
+    STAT_DATE_FROM: [MessageHandler(TEXT_INPUT, stat_date_from)],
+    STAT_DATE_TO: [MessageHandler(TEXT_INPUT, stat_date_to)],
+    STAT_MONTH: [MessageHandler(TEXT_INPUT, stat_month)],
+    STAT_GROUP_CURRENCY: [MessageHandler(TEXT_INPUT, stat_group_currency)],
+    STAT_CONVERT_CURRENCY: [MessageHandler(TEXT_INPUT, stat_convert_currency)],
+    STAT_SHOW_DETAILS: [MessageHandler(TEXT_INPUT, stat_show_details)],
+}
+FALLBACKS = [
+    CommandHandler("cancel", cancel),
+    CommandHandler("stop", cancel),
+    START_COMMAND,  # Add start as fallback
+]
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates of different chats concurrently, but updates of one
+    chat one by one and in arrival order. ConversationHandler only moves to
+    the next state when a callback returns, so a second update from the same
+    chat must not start before that (e.g. a double-tapped "📅 Today")."""
+    __slots__ = ("_chat_locks",)
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # One small lock per chat, the bot has a handful of users
+        self._chat_locks: dict[int, asyncio.Lock] = {}
+
+    async def do_process_update(self, update, coroutine):
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            await coroutine
+            return
+        # asyncio.Lock wakes waiters in FIFO order, so a chat's updates keep their order
+        async with self._chat_locks.setdefault(chat.id, asyncio.Lock()):
+            await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
 # ---------- Main ----------
 def main():
     # Get token from environment variables
@@ -1055,39 +1861,24 @@ def main():
     if not bot_token:
         raise RuntimeError("Environment variable BOT_TOKEN not found.")
 
-    # Initialize Google Sheets connection
-    global sheet
-    sheet = open_sheet()
-
-    app = Application.builder().token(bot_token).build()
+    # One pooled HTTP/2 client for all outgoing Bot API calls,
+    # getUpdates gets its own so long polling doesn't occupy the pool
+    app = (
+        Application.builder()
+        .token(bot_token)
+        .request(HTTPXRequest(connection_pool_size=64, http_version="2"))
+        .get_updates_request(HTTPXRequest(http_version="2"))
+        # Different chats in parallel, each chat's updates in order
+        .concurrent_updates(PerChatUpdateProcessor(64))
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .build()
+    )
 
     conv = ConversationHandler(
-        entry_points=[CommandHandler("start", start)],
-        states={
-            CHOOSE_ACTION: [MessageHandler(filters.TEXT & ~filters.COMMAND, choose_action)],
-            CHOOSE_CAT: [MessageHandler(filters.TEXT & ~filters.COMMAND, choose_cat)],
-            TYPING_AMT: [MessageHandler(filters.TEXT & ~filters.COMMAND, type_amount)],
-            CHOOSE_CUR: [MessageHandler(filters.TEXT & ~filters.COMMAND, choose_cur)],
-            TYPING_CMNT: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, type_comment),
-                CallbackQueryHandler(type_comment, pattern="^(skip|to_start)$")
-            ],
-            CHOOSE_DT: [CallbackQueryHandler(choose_dt)],
-            TYPING_DT: [MessageHandler(filters.TEXT & ~filters.COMMAND, type_dt)],
-            STAT_CAT: [MessageHandler(filters.TEXT & ~filters.COMMAND, stat_cat)],
-            STAT_TYPE: [MessageHandler(filters.TEXT & ~filters.COMMAND, stat_type)],
-            STAT_DATE_FROM: [MessageHandler(filters.TEXT & ~filters.COMMAND, stat_date_from)],
-            STAT_DATE_TO: [MessageHandler(filters.TEXT & ~filters.COMMAND, stat_date_to)],
-            STAT_MONTH: [MessageHandler(filters.TEXT & ~filters.COMMAND, stat_month)],
-            STAT_GROUP_CURRENCY: [MessageHandler(filters.TEXT & ~filters.COMMAND, stat_group_currency)],
-            STAT_CONVERT_CURRENCY: [MessageHandler(filters.TEXT & ~filters.COMMAND, stat_convert_currency)],
-            STAT_SHOW_DETAILS: [MessageHandler(filters.TEXT & ~filters.COMMAND, stat_show_details)],
-        },
-        fallbacks=[
-            CommandHandler("cancel", cancel),
-            CommandHandler("stop", cancel),
-            CommandHandler("start", start),  # Add start as fallback
-        ],
+        entry_points=ENTRY_POINTS,
+        states=STATE_HANDLERS,
+        fallbacks=FALLBACKS,
         allow_reentry=True,
     )
 
@@ -1109,12 +1900,22 @@ def main():
         app.run_polling()
     else:
         print(f"Running in webhook mode, URL: {render_url}")
-        # Start webhook. Token is used as secret path in URL.
+        # Telegram sends WEBHOOK_SECRET in X-Telegram-Bot-Api-Secret-Token header,
+        # requests without it are rejected before any update parsing
+        webhook_secret = os.getenv("WEBHOOK_SECRET")
+        if webhook_secret:
+            # Header check is enough, bot token stays out of the URL
+            url_path = "telegram"
+        else:
+            print("⚠️  WEBHOOK_SECRET not set, using bot token as secret URL path")
+            url_path = bot_token
+        # run_webhook registers the URL with Telegram on every start
         app.run_webhook(
             listen="0.0.0.0",
             port=port,
-            url_path=bot_token,
-            webhook_url=f"{render_url}/{bot_token}"
+            url_path=url_path,
+            webhook_url=f"{render_url}/{url_path}",
+            secret_token=webhook_secret,
         )
 
 
@@ -5,12 +5,19 @@
 
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 # Добавляем текущую директорию в путь для импорта
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from bot import test_google_sheets_connection, load_categories, open_sheet
 
+
+def read_data_rows():
+    """Читает все строки листа Data."""
+    return open_sheet("Data").get_all_values()
+
+
 def main():
     print("🔍 Тестирование подключения к Google Sheets...")
     print("=" * 50)
@@ -18,6 +25,7 @@ def main():
     # Проверяем переменные окружения
     print("📋 Проверка переменных окружения:")
     creds_path = os.getenv("GOOGLE_CREDS_PATH")
+    sheet_id = os.getenv("SHEET_ID")
     sheet_name = os.getenv("SHEET_NAME")
     
     if creds_path:
@@ -29,10 +37,12 @@ def main():
     else:
         print("❌ GOOGLE_CREDS_PATH не установлена")
     
+    if sheet_id:
+        print(f"✅ SHEET_ID: {sheet_id}")
     if sheet_name:
         print(f"✅ SHEET_NAME: {sheet_name}")
-    else:
-        print("❌ SHEET_NAME не установлена")
+    elif not sheet_id:
+        print("❌ SHEET_ID или SHEET_NAME не установлена")
     
     print("\n🔗 Тестирование подключения:")
     
@@ -40,6 +50,11 @@ def main():
     if test_google_sheets_connection():
         print("✅ Подключение к Google Sheets успешно!")
         
+        # Лист Data читается в фоне, пока категории загружаются и выводятся
+        pool = ThreadPoolExecutor(max_workers=1)
+        rows_future = pool.submit(read_data_rows)
+        pool.shutdown(wait=False)  # поток всё равно дочитает лист
+        
         # Пытаемся загрузить категории
         print("\n📋 Загрузка категорий:")
         try:
@@ -56,11 +71,9 @@ def main():
         # Пытаемся открыть основной лист данных
         print("\n📊 Тестирование основного листа данных:")
         try:
-            data_sheet = open_sheet("Data")
+            rows = rows_future.result()
             print("✅ Лист Data доступен")
             
-            # Пытаемся получить несколько строк
-            rows = data_sheet.get_all_values()
             if rows:
                 print(f"✅ Найдено {len(rows)} строк данных")
                 if len(rows) > 1: